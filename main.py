@@ -1,54 +1,107 @@
 import streamlit as st
-from pyfair import FairModel
 import streamlit.components.v1 as components
-from pyecharts.charts import Bar
-from pyecharts import options as opts
 import numpy as np
-import pandas as pd
 import math
+import orjson
+import threading
+import types
+
+# NumPy is for the simulated arrays only. Scalar inputs and statistics stay as
+# Python floats and use the math module (e.g. math.sqrt), since NumPy ufuncs on
+# single values pay array dispatch overhead for no benefit.
+
+# Draft runs trade percentile precision for speed while inputs are being tuned
+DRAFT_SIMULATIONS = 1_000
+FULL_SIMULATIONS = 10_000
+
+# Shared across sessions, so frozen at every level
+_SECONDARY_ZERO = types.MappingProxyType(
+    {
+        "Loss Events / Year": types.MappingProxyType({"Min": 0, "Avg": 0, "Max": 0}),
+        "Loss Magnitude": types.MappingProxyType({"Min": 0, "Avg": 0, "Max": 0}),
+    }
+)
+
+_PERCENTILE_LABELS = tuple(f"{i}th-percentile" for i in range(1, 100))
+_PCTL_PROBS = np.linspace(0.01, 0.99, 99)
+_PCTL_PROBS.flags.writeable = False
+
+# Static ECharts option for the ALE chart; only the series data varies per run
+_ALE_CHART_OPTION = {
+    "title": {"text": "FAIR Model ALE Summary"},
+    "tooltip": {"trigger": "axis", "axisPointer": {"type": "cross"}},
+    "toolbox": {
+        "show": True,
+        "feature": {
+            "saveAsImage": {},
+            "restore": {},
+            "dataView": {"readOnly": False},
+            "dataZoom": {},
+            "magicType": {"type": ["line", "bar"]},
+        },
+    },
+    "legend": {"data": ["ALE (Combined Risk)"]},
+    "xAxis": {"type": "category", "data": list(_PERCENTILE_LABELS)},
+    "yAxis": {"name": "Dollars"},
+}
+_ALE_CHART_SERIES = {
+    "type": "bar",
+    "name": "ALE (Combined Risk)",
+    "barGap": -0.2,
+    "label": {"show": False},
+    "itemStyle": {"color": "#d94e5d"},
+}
+_ALE_CHART_TEMPLATE = """
+<div id="ale-chart" style="width:900px; height:500px;"></div>
+<script src="https://assets.pyecharts.org/assets/v5/echarts.min.js"></script>
+<script>
+echarts.init(document.getElementById("ale-chart")).setOption({option});
+</script>
+"""
 
 def format_currency(value):
     """Helper function to format currency values."""
     return "${:,.2f}".format(value)
 
 
-def calculate_summary_statistics(results):
+def calculate_summary_statistics(lef_summary, lm_summary):
     """
     Calculate summary statistics from FAIR model results.
 
-    :param results: Dictionary containing FAIR model results.
+    :param lef_summary: Summary tuple of Loss Event Frequency values from _summarize.
+    :param lm_summary: Summary tuple of Loss Magnitude values from _summarize.
     :return: Dictionary containing calculated statistics.
     """
-    # Example structure for results: {'Loss Event Frequency': [values], 'Loss Magnitude': [values]}
-    lef_values = results["Loss Event Frequency"]
-    lm_values = results["Loss Magnitude"]
+    lef_min, lef_mean, lef_max, _ = lef_summary
+    lm_min, lm_mean, lm_max, _ = lm_summary
 
     # Primary stats
     primary_stats = {
-        "Loss Events / Year": {
-            "Min": np.min(lef_values),
-            "Avg": np.mean(lef_values),
-            "Max": np.max(lef_values),
-        },
+        "Loss Events / Year": {"Min": lef_min, "Avg": lef_mean, "Max": lef_max},
         "Loss Magnitude": {
-            "Min": format_currency(np.min(lm_values)),
-            "Avg": format_currency(np.mean(lm_values)),
-            "Max": format_currency(np.max(lm_values)),
+            "Min": format_currency(lm_min),
+            "Avg": format_currency(lm_mean),
+            "Max": format_currency(lm_max),
         },
     }
 
-    # Assuming secondary stats are calculated similarly or are placeholders
-    secondary_stats = {
-        "Loss Events / Year": {"Min": 0, "Avg": 0, "Max": 0},
-        "Loss Magnitude": {"Min": 0, "Avg": 0, "Max": 0},
-    }
+    # Secondary stats are placeholders until the model produces secondary losses
+    secondary_stats = _SECONDARY_ZERO
 
     # Example calculation for vulnerability (this would depend on your specific model or criteria)
-    vulnerability = np.mean(lef_values) * 100  # Example metric
+    vulnerability = lef_mean * 100  # Example metric
 
     return primary_stats, secondary_stats, vulnerability
 
 
+def _stats_table(stats):
+    """Transpose row-keyed statistics into the column-keyed dict st.table expects."""
+    return {
+        column: {row: values[column] for row, values in stats.items()}
+        for column in ("Min", "Avg", "Max")
+    }
+
+
 def display_statistics_in_streamlit(primary_stats, secondary_stats, vulnerability):
     """
     Display the calculated summary statistics in Streamlit.
@@ -59,17 +112,11 @@ def display_statistics_in_streamlit(primary_stats, secondary_stats, vulnerabilit
     """
     # Display Primary Statistics
     st.subheader("Primary")
-    primary_df = pd.DataFrame.from_dict(primary_stats, orient="index").rename(
-        columns={0: "Min", 1: "Avg", 2: "Max"}
-    )
-    st.table(primary_df)
+    st.table(_stats_table(primary_stats))
 
     # Display Secondary Statistics
     st.subheader("Secondary")
-    secondary_df = pd.DataFrame.from_dict(secondary_stats, orient="index").rename(
-        columns={0: "Min", 1: "Avg", 2: "Max"}
-    )
-    st.table(secondary_df)
+    st.table(_stats_table(secondary_stats))
 
     # Display Vulnerability
     st.subheader("Vulnerability")
@@ -105,23 +152,25 @@ def display_vulnerability_input():
         vulnerability_scores = st.text_area("Enter vulnerability scores, separated by commas", "0.5, 0.6, 0.4")
         vulnerability_submitted = st.form_submit_button("Submit Vulnerability Scores")
         if vulnerability_submitted:
-            vulnerability_scores = [float(score.strip()) for score in vulnerability_scores.split(",")]
+            vulnerability_scores = np.array(
+                vulnerability_scores.split(","), dtype=np.float64
+            )
             st.session_state["vulnerability_scores"] = vulnerability_scores
             st.success("Vulnerability scores submitted successfully!")
 
 
 def calculate_vulnerability_statistics(vulnerability_scores):
     """
-    Calculate mean and standard deviation for the given list of vulnerability scores.
+    Calculate mean and standard deviation for the given array of vulnerability scores.
 
-    :param vulnerability_scores: List of vulnerability scores.
+    :param vulnerability_scores: Array of vulnerability scores.
     :return: Tuple containing the mean and standard deviation of the scores.
     """
-    if not vulnerability_scores:
+    if vulnerability_scores is None or len(vulnerability_scores) == 0:
         return None, None  # or default values
-    
-    vulnerability_mean = np.mean(vulnerability_scores)
-    vulnerability_std_dev = np.std(vulnerability_scores)
+
+    vulnerability_mean = float(vulnerability_scores.mean())
+    vulnerability_std_dev = float(vulnerability_scores.std())
     
     return vulnerability_mean, vulnerability_std_dev
 
@@ -137,49 +186,101 @@ def display_vulnerability_statistics(vulnerability_mean, vulnerability_std_dev):
 
 
 
-def calculate_fair_model(lm_min, lm_max, tef, tef_stdev, vuln, vuln_stdev):
+@st.cache_resource
+def _get_simulation_lock():
+    return threading.Lock()
+
+
+@st.cache_data(max_entries=128, show_spinner=False)
+def calculate_fair_model(
+    lm_min, lm_max, tef, tef_stdev, vuln, vuln_stdev, n_simulations=FULL_SIMULATIONS
+):
+    """
+    Run the FAIR Monte Carlo simulation for the given inputs.
+
+    Results are memoized on the inputs so Streamlit reruns with unchanged
+    values skip the simulation entirely.
+
+    :return: Dictionary mapping each FAIR node name to its simulated values.
+    """
     # lef_mean = (lef_min + lef_max) / 2
-    # lef_stdev = (lef_max - lef_min) / np.sqrt(12)
+    # lef_stdev = (lef_max - lef_min) / math.sqrt(12)
     lm_mode = (lm_min + lm_max) / 2
 
-    model = FairModel(name="Basic Model", n_simulations=10_000)
-    # model.input_data("Loss Event Frequency", mean=lef_mean, stdev=lef_stdev)
-    model.input_data("Loss Magnitude", low=lm_min, high=lm_max, mode=lm_mode)
-    model.input_data("Threat Event Frequency", mean=tef, stdev=tef_stdev)
-    model.input_data("Vulnerability", mean=vuln, stdev=vuln_stdev)
-    model.calculate_all()
+    # Imported lazily so sessions that never run the model skip pyfair's import
+    from pyfair import FairModel
+
+    # pyfair seeds and samples the process-global np.random state, so only one
+    # simulation may run at a time for results to stay reproducible
+    with _get_simulation_lock():
+        # A fresh model reseeds the RNG, keeping results reproducible per input set
+        model = FairModel(name="Basic Model", n_simulations=n_simulations)
+        # model.input_data("Loss Event Frequency", mean=lef_mean, stdev=lef_stdev)
+        model.input_data("Loss Magnitude", low=lm_min, high=lm_max, mode=lm_mode)
+        model.input_data("Threat Event Frequency", mean=tef, stdev=tef_stdev)
+        model.input_data("Vulnerability", mean=vuln, stdev=vuln_stdev)
+        model.calculate_all()
+
+    results = model.export_results()
+    return {
+        column: np.ascontiguousarray(results[column], dtype=np.float64)
+        for column in results.columns
+    }
 
-    return model
 
+def _build_ale_values(lef_summary, lm_summary):
+    return lef_summary * lm_summary
 
-def generate_ale_summary_chart(lef_summary, lm_summary):
-    ale_summary = {
-        f"{i}th_percentile": lef_summary[f"{i}th_percentile"]
-        * lm_summary[f"{i}th_percentile"]
-        for i in range(1, 100)
-    }
-    rect_chart = Bar()
-    labels = [f"{i}th-percentile" for i in range(1, 100)]
-    rect_chart.add_xaxis(labels)
-    rect_chart.add_yaxis("ALE (Combined Risk)", list(ale_summary.values()), gap=-0.2)
-    rect_chart.set_global_opts(
-        title_opts=opts.TitleOpts(title="FAIR Model ALE Summary"),
-        tooltip_opts=opts.TooltipOpts(trigger="axis", axis_pointer_type="cross"),
-        yaxis_opts=opts.AxisOpts(name="Dollars"),
-        xaxis_opts=opts.AxisOpts(type_="category"),
-        toolbox_opts=opts.ToolboxOpts(is_show=True),
-    )
-    rect_chart.set_series_opts(
-        label_opts=opts.LabelOpts(is_show=False),
-        itemstyle_opts=opts.ItemStyleOpts(color="#d94e5d"),
+
+@st.cache_data(show_spinner=False)
+def _render_ale_html(ale_bytes):
+    """
+    Render the ALE bar chart to embeddable HTML.
+
+    :param ale_bytes: Raw float64 buffer of the ALE values, used as the cache key.
+    :return: HTML string for components.html.
+    """
+    # Whole dollars are plenty for bar heights and keep decimals out of the JSON
+    ale_values = np.frombuffer(ale_bytes, dtype=np.float64)
+    ale_summary = np.rint(ale_values).astype(np.int64)
+    option = dict(
+        _ALE_CHART_OPTION, series=[dict(_ALE_CHART_SERIES, data=ale_summary)]
     )
+    option_json = orjson.dumps(option, option=orjson.OPT_SERIALIZE_NUMPY)
+    return _ALE_CHART_TEMPLATE.format(option=option_json.decode())
 
-    html_content = rect_chart.render_embed()
-    return html_content
 
+def generate_ale_summary_chart(lef_summary, lm_summary):
+    ale = _build_ale_values(lef_summary, lm_summary)
+    return _render_ale_html(ale.tobytes())
+
+
+@st.cache_data(show_spinner=False)
+def _summarize(values):
+    """
+    Summarize simulated values from a single sort.
 
-def calculate_percentiles(values):
-    return {f"{i}th_percentile": np.percentile(values, i) for i in range(1, 100)}
+    Percentiles use the same linear interpolation as np.quantile.
+
+    :param values: Array of simulated values.
+    :return: Tuple of (min, mean, max, percentiles) where percentiles holds the
+        1st through 99th percentiles.
+    """
+    sorted_values = np.sort(values)
+    n = sorted_values.size
+    positions = _PCTL_PROBS * (n - 1)
+    lower = np.floor(positions).astype(np.intp)
+    upper = np.minimum(lower + 1, n - 1)
+    fraction = positions - lower
+    percentiles = sorted_values[lower] + (
+        sorted_values[upper] - sorted_values[lower]
+    ) * fraction
+    return (
+        float(sorted_values[0]),
+        float(sorted_values.mean()),
+        float(sorted_values[-1]),
+        percentiles,
+    )
 
 
 def display_tef_calculator():
@@ -311,34 +412,40 @@ def main():
                 help="Enter the standard deviation estimated for Vulnerability",
             )
 
+        final_run = st.checkbox(
+            label="Final run",
+            key="final_run",
+            help=f"Run the full {FULL_SIMULATIONS:,} simulations instead of a {DRAFT_SIMULATIONS:,}-simulation draft.",
+        )
         submitted = st.form_submit_button("Calculate Risk")
 
     if submitted:
+        n_simulations = FULL_SIMULATIONS if final_run else DRAFT_SIMULATIONS
         with st.spinner("Calculating..."):
-            st.write(f"calculate_fair_model({lm_min_value}, {lm_max_value}, {tef}, {tef_stdev}, {vuln}, {vuln_stdev})")
+            st.write(f"calculate_fair_model({lm_min_value}, {lm_max_value}, {tef}, {tef_stdev}, {vuln}, {vuln_stdev}, {n_simulations})")
 
-            model = calculate_fair_model(
+            results = calculate_fair_model(
                 lm_min_value,
                 lm_max_value,
                 tef,
                 tef_stdev,
                 vuln,
                 vuln_stdev,
+                n_simulations,
             )
-            results = model.export_results()
             lef_values = results["Loss Event Frequency"]
             lm_values = results["Loss Magnitude"]
 
-            lef_summary = calculate_percentiles(lef_values)
-            lm_summary = calculate_percentiles(lm_values)
+            lef_summary = _summarize(lef_values)
+            lm_summary = _summarize(lm_values)
 
             echarts_html_curve_summary = generate_ale_summary_chart(
-                lef_summary, lm_summary
+                lef_summary[3], lm_summary[3]
             )
             components.html(echarts_html_curve_summary, height=500, width=900)
 
             primary_stats, secondary_stats, vulnerability = (
-                calculate_summary_statistics(results)
+                calculate_summary_statistics(lef_summary, lm_summary)
             )
             display_statistics_in_streamlit(
                 primary_stats, secondary_stats, vulnerability